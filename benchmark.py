@@ -0,0 +1,171 @@
+import io
+import os
+import copy
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+import connector
+
+
+def main():
+    # python3 benchmark.py --cores 64 --dumps 100
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cores", help="the number of cores in the synthetic system", type=int, default=16)
+    parser.add_argument("--dumps", help="the number of stats dumps in the synthetic stats.txt", type=int, default=100)
+    parser.add_argument("--example", help="the example the synthetic system is cloned from",
+                        default=os.path.join(os.path.dirname(os.path.realpath(__file__)), "examples/o3cpu"))
+    parser.add_argument("--json", help="the file to write the machine-readable report to")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {
+            "m5out": os.path.join(directory, "m5out"),
+            "input": os.path.join(directory, "input"),
+            "output": os.path.join(directory, "output"),
+            "attributes": os.path.join(args.example, "attributes.yaml"),
+            "mappings": [os.path.join(os.path.dirname(os.path.realpath(connector.__file__)), "mappings")]
+        }
+        lines = generateM5out(args.example, paths["m5out"], args.cores, args.dumps)
+        report = runBenchmark(paths, args.cores, args.dumps, lines)
+
+    printReport(report)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+def generateM5out(example, m5out, cores, dumps):
+    # clones the single core of the example into a system of the given number of cores
+    os.makedirs(m5out)
+    with open(os.path.join(example, "m5out/config.json")) as file:
+        config = json.load(file)
+    cpu = config["system"]["cpu"]
+    if type(cpu) == list:
+        cpu = cpu[0]
+    config["system"]["cpu"] = [copy.deepcopy(cpu) for core in range(cores)]
+    with open(os.path.join(m5out, "config.json"), "w") as file:
+        json.dump(config, file)
+
+    # stats of system.cpu are repeated for every core, all other stats are kept once per dump
+    with open(os.path.join(example, "m5out/stats.txt")) as file:
+        block = next(readBlocks(file))
+    shared = [line for line in block if not line.startswith("system.cpu.")]
+    per_core = [line[len("system.cpu."):] for line in block if line.startswith("system.cpu.")]
+    lines = 0
+    with open(os.path.join(m5out, "stats.txt"), "w") as file:
+        for dump in range(dumps):
+            file.write("\n---------- Begin Simulation Statistics ----------\n")
+            file.writelines(shared)
+            for core in range(cores):
+                prefix = "system.cpu%d." % core
+                file.writelines(prefix + line for line in per_core)
+            file.write("\n---------- End Simulation Statistics   ----------\n")
+            lines += len(shared) + cores * len(per_core) + 4
+    return lines
+
+
+def readBlocks(lines):
+    block = None
+    for line in lines:
+        if line.startswith("---------- Begin"):
+            block = []
+        elif line.startswith("---------- End"):
+            yield block
+            block = None
+        elif block is not None and line.strip() != "":
+            block.append(line)
+
+
+def runBenchmark(paths, cores, dumps, lines):
+    report = {"cores": cores, "dumps": dumps, "stats_lines": lines, "phases": {}}
+    args = argparse.Namespace(v=False, d=True, j=1, numpy=False, f=False, columnar=None)
+    config_path = os.path.join(paths["m5out"], "config.json")
+    stats_path = os.path.join(paths["m5out"], "stats.txt")
+
+    with open(paths["attributes"]) as file:
+        attributes = connector.loadYaml(file)
+    registry = connector.MappingRegistry(paths["mappings"])
+    classes = registry.getClasses()
+    measure(report, "load_config", lambda: loadFile(config_path, "r", connector.loadJson))
+    config = measure(report, "load_config_pruned",
+                     lambda: loadFile(config_path, "r", lambda file: connector.loadConfig(file, classes, False)))
+    if connector.ijson is not None:
+        measure(report, "load_config_streamed",
+                lambda: loadFile(config_path, "rb", lambda file: connector.loadConfig(file, classes, True)))
+    measure(report, "parse_stats", lambda: loadFile(stats_path, "r", lambda file: consume(connector.parseStats(file))),
+            dumps=dumps, lines=lines)
+    measure(report, "arch", lambda: connector.Arch(attributes, config))
+    plan = measure(report, "compile_mappings", lambda: connector.compileMappings(attributes, config, registry, False))
+    parse = lambda file: consume(connector.parseStats(file, plan.getStatKeys(), prefixes=plan.getStatPrefixes()))
+    measure(report, "parse_stats_selective", lambda: loadFile(stats_path, "r", parse), dumps=dumps, lines=lines)
+
+    # the inputs of the later phases are prepared outside of them, so that they are neither timed nor traced
+    with open(stats_path) as file:
+        stats_list = list(connector.parseStats(file, plan.getStatKeys(), prefixes=plan.getStatPrefixes()))
+    measure(report, "process_mappings", lambda: consume(plan.evaluateDumps(enumerate(stats_list), False)), dumps=dumps)
+    if connector.numpy is not None:
+        measure(report, "process_mappings_numpy", lambda: consume(plan.evaluateDumps(enumerate(stats_list), True)),
+                dumps=dumps)
+    evaluated = list(plan.evaluateDumps(enumerate(stats_list), False))
+
+    def emitYaml():
+        for index, totals, missing in evaluated:
+            connector.processStats(plan, None, (index, totals, missing, None), paths, args, dumps)
+    measure(report, "emit_yaml", emitYaml, dumps=dumps)
+    return report
+
+
+def loadFile(path, mode, load):
+    with open(path, mode) as file:
+        return load(file)
+
+
+def consume(iterator):
+    # iterates without keeping the items, so that only the memory of a single item is held at a time
+    for item in iterator:
+        pass
+
+
+def measure(report, phase, run, dumps=None, lines=None):
+    # the phase is timed in a first run and traced in a second one, as tracing slows down the allocations it records
+    # console output of the connector is discarded so that only the phase itself is measured
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        value = run()
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    result = {"seconds": seconds, "peak_memory_mb": peak / (1024 * 1024)}
+    if dumps is not None:
+        result["dumps_per_second"] = dumps / seconds if seconds > 0 else None
+    if lines is not None:
+        result["lines_per_second"] = lines / seconds if seconds > 0 else None
+    report["phases"][phase] = result
+    return value
+
+
+def printReport(report):
+    print("%d cores, %d dumps, %d stats lines" % (report["cores"], report["dumps"], report["stats_lines"]))
+    print("%-24s %10s %12s %14s %14s" % ("phase", "seconds", "dumps/s", "lines/s", "peak MB"))
+    for phase, result in report["phases"].items():
+        print("%-24s %10.3f %12s %14s %14.1f" % (
+            phase, result["seconds"], formatRate(result.get("dumps_per_second")),
+            formatRate(result.get("lines_per_second")), result["peak_memory_mb"]))
+
+
+def formatRate(rate):
+    if rate is None:
+        return "-"
+    return "%.1f" % rate
+
+
+if __name__ == "__main__":
+    main()
@@ -1,115 +1,1125 @@
+import io
 import os
 import re
+import ast
+import bz2
+import csv
 import sys
+import gzip
+import lzma
 import yaml
+import glob
+import array
 import json
+import time
+import shlex
+import shutil
+import signal
+import bisect
+import fnmatch
+import hashlib
 import argparse
+import itertools
+import threading
+import importlib.util
+import contextlib
+import subprocess
+import collections
+import concurrent.futures
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:  # libyaml bindings are much faster than the pure python loader and dumper
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
+NUMPY_BLOCK_SIZE = 1024  # number of dumps evaluated per matrix multiply
+CONFIG_PATHS = {"system.clk_domain"}  # config nodes read by Arch in addition to the mapped gem5 classes
+CONFIG_STREAM_SIZE = 64 * 1024 * 1024  # config files above this size are streamed, smaller ones load faster at once
+TRACE_STATS = ["sim_ticks", "sim_freq", "sim_seconds"]  # stats giving the simulated time of each dump
+CONSTANT_STATS = {"sim_freq"}  # stats that are the same for every dump, kept instead of summed by --window
+COMPRESSED_EXTENSIONS = [".gz", ".bz2", ".xz", ".zst"]  # compressed inputs read by openInput
 
 
 def main():
     # python3 connector.py -m example/m5out -i example/input -o example/output -c example/attributes.yaml
     parser = argparse.ArgumentParser()
-    parser.add_argument("-m", help="the gem5 m5out directory path", required=True)
+    parser.add_argument("-m", help="the gem5 m5out directory path, several paths or glob patterns convert a batch of runs",
+                        nargs="+", required=True)
     parser.add_argument("-i", help="the directory to put the accelergy input", required=True)
     parser.add_argument("-o", help="the directory to put the accelergy output", required=True)
-    parser.add_argument("-a", help="the attributes file for this converter", required=True)
+    parser.add_argument("-a", help="the attributes file for this converter, in a batch only used for runs without "
+                                   "their own attributes.yaml")
     parser.add_argument("-d", help="when present accelergy will not be called", action="store_true")
     parser.add_argument("-v", help="when present output will be verbose", action="store_true")
+    parser.add_argument("--mappings", help="an additional directory of mapping files, a file named like a bundled "
+                                           "mapping replaces it; may be given several times", action="append",
+                        default=[])
+    parser.add_argument("-j", help="the number of worker processes used to process stats dumps", type=int, default=1)
+    parser.add_argument("-e", help="when present accelergy is called once to generate the ERT and the energy of "
+                                   "every dump is estimated by the converter", action="store_true")
+    parser.add_argument("--cache", help="the directory of the ERT/ART cache shared between runs, implies -e")
+    parser.add_argument("--cache-size", help="the maximum size of the ERT/ART cache in MB", type=float, default=256)
+    parser.add_argument("--numpy", help="when present action counts are computed with NumPy matrix operations",
+                        action="store_true")
+    parser.add_argument("-f", help="when present stats.txt is followed and dumps are processed while gem5 is running",
+                        action="store_true")
+    parser.add_argument("--follow-timeout", help="the number of seconds without new stats after which -f stops",
+                        type=float, default=None)
+    parser.add_argument("--columnar", help="when present the architecture is written once and the action counts of "
+                                           "all dumps are written to a single csv or npz file",
+                        nargs="?", const="csv", choices=["csv", "npz"])
+    parser.add_argument("--expand", help="comma separated dumps of an existing columnar output for which the per-dump "
+                                         "accelergy input is generated")
+    parser.add_argument("--trace", help="when present the energy and average power of every component per dump are "
+                                        "written to power_trace.csv in the output directory, implies -e",
+                        action="store_true")
+    parser.add_argument("--dedup", help="when present dumps with the same action counts as an earlier dump are not "
+                                        "written or handed to accelergy again", action="store_true")
+    parser.add_argument("--profile", help="when present wall time and call counts of each phase and mapping are "
+                                          "written to profile.json in the output directory", action="store_true")
+    parser.add_argument("--diagnostics", help="when present the warnings of the run and how often they occurred are "
+                                              "written to diagnostics.json in the output directory",
+                        action="store_true")
+    parser.add_argument("--dumps", help="the dumps to process as start:stop:step, numbered from 1 like the stats-N "
+                                        "directories and including stop, e.g. 100:200 or ::10")
+    parser.add_argument("--window", help="the number of consecutive selected dumps merged into one by summing their "
+                                         "stats", type=int, default=1)
+    parser.add_argument("--accelergy-jobs", help="the number of accelergy processes run at the same time while the "
+                                                 "next dumps are processed", type=int, default=1)
+    parser.add_argument("--accelergy-timeout", help="the number of seconds after which an accelergy process is "
+                                                    "stopped", type=float, default=None)
     args = parser.parse_args()
+    profiler.enabled = args.profile
+    diagnostics.verbose = args.v
+    if args.numpy and numpy is None:
+        parser.error("--numpy requires the numpy package")
+    if args.columnar == "npz" and numpy is None:
+        parser.error("--columnar npz requires the numpy package")
+    if args.f and args.j > 1:
+        parser.error("-f cannot be combined with -j")
+    if args.window < 1:
+        parser.error("--window must be at least 1")
+    if args.accelergy_jobs < 1:
+        parser.error("--accelergy-jobs must be at least 1")
+    if args.f and args.window > 1:
+        parser.error("-f cannot be combined with --window")
+    if args.f and args.trace:
+        parser.error("-f cannot be combined with --trace")
+    if args.columnar and (args.f or args.dedup):
+        parser.error("--columnar cannot be combined with -f or --dedup")
+    if args.f and args.dedup:
+        parser.error("-f cannot be combined with --dedup")
+    if args.dumps is not None:
+        try:
+            args.dumps = parseDumpRange(args.dumps)
+        except ValueError:
+            parser.error("--dumps must be given as start:stop:step with positive numbers and start not after stop")
+    if args.expand is not None:
+        try:
+            args.expand = parseDumpList(args.expand)
+        except ValueError:
+            parser.error("--expand must be given as comma separated positive dump numbers")
+    m5outs = []
+    for pattern in args.m:
+        if glob.has_magic(pattern):
+            m5outs += sorted(path for path in glob.glob(pattern) if os.path.isdir(path))
+        else:
+            m5outs.append(pattern)
+    if len(m5outs) > 1:
+        if args.f or args.expand:
+            parser.error("-f and --expand cannot be used with several m5out directories")
+        processBatch(m5outs, args)
+        return
+    if len(m5outs) == 0:
+        parser.error("no m5out directory matches %s" % " ".join(args.m))
+    if args.a is None:
+        parser.error("the following arguments are required: -a")
+    if args.columnar and args.j > 1:
+        parser.error("--columnar cannot be combined with -j for a single m5out directory")
     paths = {
-        "m5out": args.m,
+        "m5out": m5outs[0],
         "input": args.i,
         "output": args.o,
         "attributes": args.a,
-        "mappings": os.path.dirname(os.path.realpath(__file__)) + "/mappings"
+        "mappings": [os.path.dirname(os.path.realpath(__file__)) + "/mappings"] + args.mappings
     }
 
+    # Generate per-dump accelergy input from an existing columnar output
+    if args.expand:
+        expandColumnar(args.expand, paths, args)
+        return
+
+    convertRun(paths, args)
+
+
+def convertRun(paths, args):
+    # converts a single m5out directory and returns the number of processed dumps, windows counting once
+    profiler.records = {}
+    diagnostics.records = {}
+
     # Read attributes file
-    with open(paths["attributes"]) as file:
-        attributes = yaml.load(file, Loader=yaml.FullLoader)
-    # Read gem5 config file
-    with open(paths["m5out"] + "/config.json") as f:
-        config = json.load(f)
-    # Read gem5 stats file
-    with open(paths["m5out"] + "/stats.txt", "r") as file:
-        stats_list = parseStats(file.readlines())
+    with profiler.measure("phases/load_attributes"), open(paths["attributes"]) as file:
+        attributes = loadYaml(file)
+    # Index mappings by gem5 class
+    registry = MappingRegistry(paths["mappings"])
+    # Read gem5 config file, keeping only the SimObjects needed by the mappings
+    classes = registry.getClasses()
+    config_path = findInput(paths["m5out"] + "/config.json")
+    stream = ijson is not None and os.path.getsize(config_path) > CONFIG_STREAM_SIZE
+    with profiler.measure("phases/load_config"), openInput(config_path, binary=stream) as f:
+        config = loadConfig(f, classes, stream)
+    # Compile mappings once for all dumps
+    with profiler.measure("phases/compile_mappings"):
+        plan = compileMappings(attributes, config, registry, args.v)
+
+    # Generate the energy reference table once for all dumps
+    ert = None
+    if args.e or args.cache or args.trace:
+        cache = None
+        if args.cache:
+            cache = ERTCache(args.cache, int(args.cache_size * 1024 * 1024))
+        with profiler.measure("phases/generate_ert"):
+            ert = generateERT(plan, attributes, cache, paths, args)
+
+    keys = plan.getStatKeys()
+    prefixes = plan.getStatPrefixes()
+    if args.trace:
+        keys.update(TRACE_STATS)
+
+    processed = {"dumps": 0}
+    jobs = []
+    if args.f:
+        # Follow gem5 stats file and process each dump once it is complete, after rerunning accelergy for the dumps
+        # whose accelergy run was stopped by an interrupt of the previous follow
+        state_path = os.path.join(paths["input"], "follow.json")
+        stopped = readFollowState(state_path).get("stopped", [])
+        try:
+            rerunStopped(stopped, paths, args, jobs)
+            dumps = followStats(paths["m5out"] + "/stats.txt", state_path, keys, prefixes, args.dumps,
+                                args.follow_timeout)
+            dumps = countDumps(profiler.iterate("phases/follow_stats", dumps), processed)
+            processDumps(plan, ert, dumps, paths, args, None, jobs)
+        except KeyboardInterrupt:
+            print("\nStopped following, processed dumps are recorded in %s" % state_path)
+        finally:
+            stopped += [os.path.basename(job["input"]) for job in jobs if job["status"] == "stopped"]
+            state = readFollowState(state_path)
+            state["stopped"] = stopped
+            writeFollowState(state_path, state)
+            if jobs:
+                writeJobs(jobs, paths, merge=True)
+        if stopped:
+            print("Accelergy was stopped for %s, it is run again when following resumes" % ", ".join(stopped))
+    else:
+        # Count gem5 stats dumps for the progress total only when verbose, since counting reads the whole file once
+        # more, and not when a selection ends before the end of the file
+        stats_path = findInput(paths["m5out"] + "/stats.txt")
+        count = None
+        if args.v and (args.dumps is None or args.dumps.stop == sys.maxsize):
+            with profiler.measure("phases/count_stats"), openInput(stats_path) as file:
+                count = countStats(file)
+
+        # Read and process gem5 stats file one dump or window of dumps at a time,
+        # the power trace also needs the simulated ticks of skipped dumps
+        skipped_keys = {"sim_ticks"} if args.trace and args.dumps is not None else None
+        try:
+            with openInput(stats_path) as file:
+                dumps = enumerate(parseStats(file, keys, prefixes=prefixes, dumps=args.dumps,
+                                             skipped_keys=skipped_keys))
+                dumps = countDumps(profiler.iterate("phases/parse_stats", windowDumps(dumps, args.window)), processed)
+                processDumps(plan, ert, dumps, paths, args, count, jobs)
+        finally:
+            if jobs:
+                writeJobs(jobs, paths)
+
+    diagnostics.summarize()
+    if args.diagnostics:
+        diagnostics.write(os.path.join(paths["output"], "diagnostics.json"))
+    if args.profile:
+        profiler.write(os.path.join(paths["output"], "profile.json"))
+    return processed["dumps"]
+
+
+def processBatch(m5outs, args):
+    # every run is written to its own directory below the input and output directories, and the runs share
+    # the imported mapping modules and, with -j, a worker pool converting one run per worker
+    runs = []
+    names = set()
+    for m5out in m5outs:
+        directory = os.path.normpath(m5out)
+        name = os.path.basename(directory)
+        if name == "m5out":
+            name = os.path.basename(os.path.dirname(directory)) or name
+        unique_name = name
+        suffix = 1
+        while unique_name in names:
+            suffix += 1
+            unique_name = "%s-%d" % (name, suffix)
+        names.add(unique_name)
+        attributes = args.a
+        for candidate in [os.path.join(directory, "attributes.yaml"),
+                          os.path.join(os.path.dirname(directory), "attributes.yaml")]:
+            if os.path.isfile(candidate):
+                attributes = candidate
+                break
+        runs.append({
+            "name": unique_name,
+            "m5out": directory,
+            "input": os.path.join(args.i, unique_name),
+            "output": os.path.join(args.o, unique_name),
+            "attributes": attributes,
+            "mappings": [os.path.dirname(os.path.realpath(__file__)) + "/mappings"] + args.mappings
+        })
+
+    run_args = argparse.Namespace(**vars(args))
+    run_args.j = 1  # parallelism is across runs
+    index = []
+    if args.j > 1:
+        with multiprocessing.Pool(args.j) as pool:
+            for output, result in pool.imap(processBatchWorker, [(paths, run_args) for paths in runs]):
+                sys.stdout.write(output)
+                index.append(result)
+    else:
+        for paths in runs:
+            index.append(convertBatchRun(paths, run_args))
+
+    os.makedirs(args.o, exist_ok=True)
+    with open(os.path.join(args.o, "index.json"), "w") as file:
+        json.dump({"runs": index}, file, indent=2)
+    failed = [result["name"] for result in index if result["status"] != "ok"]
+    print("\nConverted %d of %d runs, index written to %s" % (len(index) - len(failed), len(index),
+                                                               os.path.join(args.o, "index.json")))
+    if failed:
+        print("Failed runs: %s" % ", ".join(failed))
+
+
+def processBatchWorker(task):
+    paths, args = task
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = convertBatchRun(paths, args)
+    return output.getvalue(), result
+
+
+def convertBatchRun(paths, args):
+    print("\n=================== Converting %s ===================" % paths["name"])
+    result = {key: paths[key] for key in ["name", "m5out", "attributes", "input", "output"]}
+    try:
+        if paths["attributes"] is None:
+            raise Exception("No attributes.yaml found for %s and -a not given" % paths["m5out"])
+        result["dumps"] = convertRun(paths, args)
+        result["warnings"] = len(diagnostics.records)
+        result["status"] = "ok"
+    except Exception as error:
+        print("ERROR    %s" % error)
+        result["status"] = "failed"
+        result["error"] = str(error)
+    return result
+
+
+def processDumps(plan, ert, dumps, paths, args, count, jobs):
+    # the results of the accelergy runs are appended to jobs
+    times = {}
+    if args.trace:
+        dumps = recordTimes(dumps, times)
+    # dumps are evaluated one at a time when following, since NumPy blocks would wait for a full block of dumps
+    dumps = plan.evaluateDumps(dumps, args.numpy and not args.f)
+    if args.trace:
+        if ert is None:
+            print("Power trace is skipped since no ERT was generated")
+        else:
+            trace = PowerTrace(plan, ert, os.path.join(paths["output"], "power_trace.csv"))
+            dumps = trace.trace(dumps, times)
+    if args.columnar:
+        processColumnar(plan, ert, dumps, paths, args, count)
+        return
+    dump_index = []
+    dumps = deduplicateDumps(dumps, dump_index, args.dedup)
+    try:
+        if args.j > 1:
+            processStatsParallel(plan, ert, dumps, paths, args, count, jobs)
+        else:
+            # accelergy runs in the background while the next dumps are parsed, mapped and written
+            runner = None
+            if ert is None and not args.d:
+                runner = AccelergyRunner(args.accelergy_jobs, args.accelergy_timeout)
+            try:
+                for dump in dumps:
+                    processStats(plan, ert, dump, paths, args, count, runner)
+            except BaseException:
+                if runner is not None:
+                    runner.stop()
+                raise
+            finally:
+                if runner is not None:
+                    runner.join(jobs)
+    finally:
+        if args.dedup:
+            writeDumpIndex(dump_index, paths)
+
+
+def writeDumpIndex(dump_index, paths):
+    os.makedirs(paths["output"], exist_ok=True)
+    with open(os.path.join(paths["output"], "dumps.json"), "w") as file:
+        json.dump({"dumps": dump_index}, file, indent=2)
+
+
+def recordTimes(dumps, times):
+    # keeps the simulated ticks and seconds of each dump and the simulated time at its end for the power trace
+    for index, stats in dumps:
+        ticks = int(stats["sim_ticks"]) if "sim_ticks" in stats else None
+        if ticks is not None and "sim_freq" in stats:
+            seconds = ticks / float(stats["sim_freq"])
+        elif "sim_seconds" in stats:
+            seconds = float(stats["sim_seconds"])
+        else:
+            seconds = None
+        end_seconds = None
+        if stats.end_ticks is not None and "sim_freq" in stats:
+            end_seconds = stats.end_ticks / float(stats["sim_freq"])
+        times[index] = (ticks, seconds, end_seconds)
+        yield index, stats
 
-    # Process statistics
-    for index, stats in enumerate(stats_list):
-        processStats(attributes, config, stats, paths, args, index, len(stats_list))
 
+def deduplicateDumps(dumps, dump_index, enabled):
+    # appends the index of the first dump with identical action counts to each dump, or None for new action counts
+    fingerprints = {}
+    for index, totals, missing in dumps:
+        duplicate = None
+        if enabled:
+            fingerprint = hashlib.sha1(repr(totals).encode()).hexdigest()
+            duplicate = fingerprints.setdefault(fingerprint, index)
+            if duplicate == index:
+                duplicate = None
+                dump_index.append({"dump": index + 1, "directory": "stats-%d" % (index + 1)})
+            else:
+                dump_index.append({"dump": index + 1, "duplicate_of": duplicate + 1,
+                                   "directory": "stats-%d" % (duplicate + 1)})
+        yield index, totals, missing, duplicate
+
+
+def loadYaml(file):
+    return yaml.load(file, Loader=YamlLoader)
+
+
+def dumpYaml(data, file=None):
+    # output is identical to yaml.dump, the safe dumper only differs for python specific objects
+    try:
+        text = yaml.dump(data, Dumper=YamlDumper, sort_keys=False)
+    except yaml.representer.RepresenterError:
+        text = yaml.dump(data, sort_keys=False)
+    if file is None:
+        return text
+    file.write(text)
+
+
+def loadJson(file):
+    if orjson is not None:
+        text = file.read()
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:  # e.g. Infinity and NaN are only accepted by json
+            return json.loads(text)
+    return json.load(file)
+
+
+def loadConfig(file, classes, stream):
+    # config.json reduced to the SimObjects of the given gem5 classes and CONFIG_PATHS; when streamed with ijson
+    # (file opened in binary mode) subtrees no mapping needs are discarded while reading
+    if stream:
+        config = {}
+        events = iter(ijson.basic_parse(file, use_float=True))
+        event, value = next(events)
+        if event != "start_map":
+            raise Exception("config.json does not contain an object")
+        for event, value in events:
+            if event == "end_map":
+                break
+            if event == "map_key" and value == "system":
+                next(events)  # start_map of system
+                config["system"] = streamConfig(events, ("system",), classes, True) or {}
+            elif event == "map_key":
+                skipValue(events)
+        return config
+    config = loadJson(file)
+    return {"system": pruneConfig(config["system"], "system", classes) or {}}
 
 
-def parseStats(lines):
+def pruneConfig(source, path, classes):
+    # returns source with only the subtrees needed by the mappings, or None when nothing in it is needed;
+    # list entries that are not needed are replaced by empty objects so that entry names keep their index
+    if source.get("type") in classes or path in CONFIG_PATHS:
+        return source
+    pruned = {}
+    for key, value in source.items():
+        if type(value) == dict:
+            child = pruneConfig(value, path + "." + key, classes)
+            if child is not None:
+                pruned[key] = child
+        if type(value) == list and len(value) > 0 and type(value[0]) == dict:
+            children = []
+            for index, entry in enumerate(value):
+                if type(entry) != dict:
+                    children.append(None)
+                elif len(value) == 1:
+                    children.append(pruneConfig(entry, "%s.%s" % (path, key), classes))
+                else:
+                    children.append(pruneConfig(entry, "%s.%s%d" % (path, key, index), classes))
+            if any(child is not None for child in children):
+                pruned[key] = [child if child is not None else {} for child in children]
+    if len(pruned) == 0:
+        return None
+    return pruned
+
+
+def streamConfig(events, paths, classes, prunable):
+    # builds the object whose start_map was just read; paths are its possible dotted paths (list entries are named
+    # with or without index depending on the list length). When prunable is true every ancestor is known not to be
+    # needed, so the object can be pruned as soon as it is complete, and so can its children once its type is known
+    source = {}
+    key = None
+    for event, value in events:
+        if event == "end_map":
+            break
+        if event == "map_key":
+            key = value
+            continue
+        known = prunable and "type" in source and source["type"] not in classes
+        if event == "start_map":
+            child_paths = tuple(path + "." + key for path in paths)
+            child = streamConfig(events, child_paths, classes, known and not CONFIG_PATHS.intersection(paths))
+            if child is not None:
+                source[key] = child
+        elif event == "start_array":
+            source[key] = streamList(events, paths, key, classes, known and not CONFIG_PATHS.intersection(paths))
+        else:
+            source[key] = value
+    if not prunable:
+        return source
+    return pruneConfig(source, paths[0], classes) if not CONFIG_PATHS.intersection(paths) else source
+
+
+def streamList(events, paths, key, classes, prunable):
+    entries = []
+    for event, value in events:
+        if event == "end_array":
+            break
+        if event == "start_map":
+            entry_paths = tuple("%s.%s%d" % (path, key, len(entries)) for path in paths)
+            entry_paths += tuple("%s.%s" % (path, key) for path in paths)
+            entry = streamConfig(events, entry_paths, classes, prunable)
+            entries.append(entry if entry is not None else {})
+        elif event == "start_array":
+            entries.append(streamList(events, paths, key, classes, False))
+        else:
+            entries.append(value)
+    return entries
+
+
+def skipValue(events):
+    depth = 0
+    for event, value in events:
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+        if depth == 0:
+            return
+
+
+def findInput(path):
+    # inputs may be stored compressed, e.g. stats.txt.gz next to or instead of stats.txt
+    for extension in [""] + COMPRESSED_EXTENSIONS:
+        if os.path.isfile(path + extension):
+            return path + extension
+    raise Exception("Unable to find %s" % path)
+
+
+def openInput(path, binary=False):
+    # opens a plain or compressed file for streaming reads, detecting the compression from its magic bytes
+    mode = "rb" if binary else "rt"
+    with open(path, "rb") as file:
+        magic = file.read(6)
+    if magic.startswith(b"\x1f\x8b"):
+        return gzip.open(path, mode)
+    if magic.startswith(b"BZh"):
+        return bz2.open(path, mode)
+    if magic.startswith(b"\xfd7zXZ\x00"):
+        return lzma.open(path, mode)
+    if magic.startswith(b"\x28\xb5\x2f\xfd"):
+        if zstandard is None:
+            raise Exception("Reading zstd compressed %s requires the zstandard package" % path)
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return reader if binary else io.TextIOWrapper(reader)
+    return open(path, mode)
+
+
+def countDumps(dumps, processed):
+    for dump in dumps:
+        processed["dumps"] += 1
+        yield dump
+
+
+def countStats(lines):
+    end_pattern = re.compile(r"-+ End")
+    count = 0
+    for line in lines:
+        if end_pattern.match(line):
+            count += 1
+    return count
+
+
+def parseStats(lines, keys=None, table=None, prefixes=(), dumps=None, skipped_keys=None):
+    # generator yielding the stats of each Begin/End block as a StatsDump so only one dump is parsed at a time,
+    # when keys is given only those stats and stats starting with one of prefixes are retained;
+    # stat names are interned in table, shared by all dumps. When dumps is given, the dumps whose index is not in
+    # that range are yielded as None without being parsed and reading stops after its last dump, or with
+    # skipped_keys as a StatsDump that is not selected and holds only those stats
     begin_pattern = re.compile(r"-+ Begin")
     end_pattern = re.compile(r"-+ End")
     stats_pattern = re.compile(r"(\S+)\s+(\S+).*#")
-    stats_list = []
+    if table is None:
+        table = StatsTable()
+    stats = None
+    skipped = False
+    index = -1
     for line in lines:
         if begin_pattern.match(line):
-            stats = {}
+            index += 1
+            if dumps is not None and index >= dumps.stop:
+                return
+            skipped = dumps is not None and index not in dumps
+            stats = None if skipped and skipped_keys is None else StatsDump(table)
+            if skipped and stats is not None:
+                stats.selected = False
             continue
         if end_pattern.match(line):
-            stats_list.append(stats)
+            if stats is not None:
+                yield stats
+            elif skipped:
+                yield None
+            stats = None
+            skipped = False
+            continue
+        if stats is None:
             continue
+        if skipped:
+            fields = line.split(None, 1)
+            if not fields or fields[0] not in skipped_keys:
+                continue
+        elif keys is not None:
+            fields = line.split(None, 1)
+            if not fields or (fields[0] not in keys and not fields[0].startswith(prefixes)):
+                continue
         match = stats_pattern.match(line)
         if match:
-            stats[match.group(1)] = match.group(2)
-    return stats_list
+            stats.set(match.group(1), match.group(2))
+
+
+def followStats(path, state_path, keys, prefixes, dumps, timeout, poll=1.0):
+    # generator yielding (index, stats) for every dump completed in a stats file that is still being written;
+    # the byte offset after the last processed dump is stored in state_path so a restart resumes from there.
+    # When dumps is given only dumps in that range are parsed and following stops after its last dump
+    end_pattern = re.compile(r"-+ End")
+    table = StatsTable()
+    state = readFollowState(state_path)
+    start = time.time()
+    while not os.path.isfile(path):
+        for extension in COMPRESSED_EXTENSIONS:
+            if os.path.isfile(path + extension):
+                raise Exception("Unable to follow %s, following requires an uncompressed %s"
+                                % (path + extension, os.path.basename(path)))
+        if timeout is not None and time.time() - start > timeout:
+            return
+        time.sleep(poll)
+    with open(path, "rb") as file:
+        if os.path.getsize(path) < state["offset"]:  # stats file was restarted
+            state = {"offset": 0, "index": 0, "stopped": state.get("stopped", [])}
+        file.seek(state["offset"])
+        block = []
+        partial = b""
+        last_update = time.time()
+        while True:
+            line = file.readline()
+            if not line.endswith(b"\n"):
+                partial += line  # wait for the rest of a line that is being written
+                if timeout is not None and time.time() - last_update > timeout:
+                    return
+                time.sleep(poll)
+                continue
+            line = (partial + line).decode()
+            partial = b""
+            last_update = time.time()
+            block.append(line)
+            if end_pattern.match(line):
+                if dumps is None or state["index"] in dumps:
+                    for stats in parseStats(block, keys, table, prefixes):
+                        yield state["index"], stats
+                        state["index"] += 1
+                else:
+                    state["index"] += 1  # the block holds a single dump, which is not parsed
+                state["offset"] = file.tell()
+                block = []
+                writeFollowState(state_path, state)
+                if dumps is not None and state["index"] >= dumps.stop:
+                    return
+
+
+def readFollowState(state_path):
+    if os.path.isfile(state_path):
+        with open(state_path) as file:
+            return json.load(file)
+    return {"offset": 0, "index": 0}
+
 
+def writeFollowState(state_path, state):
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    with open(state_path + ".tmp", "w") as file:
+        json.dump(state, file)
+    os.replace(state_path + ".tmp", state_path)
 
-def processStats(attributes, config, stats, paths, args, index, count):
-    # Process mappings
-    print("\n----------------- Processing Mappings [%d/%d] ------------------" % (index + 1, count))
+
+def rerunStopped(stopped, paths, args, jobs):
+    # runs accelergy again for the stats-N directories in stopped, removing each from stopped once it has finished
+    while stopped and not args.d:
+        input_dir = os.path.join(paths["input"], stopped[0])
+        output_dir = os.path.join(paths["output"], stopped[0])
+        jobs.append(runAccelergy(input_dir, output_dir, stopped[0], args))
+        stopped.pop(0)
+
+
+def parseDumpRange(text):
+    # range of dump indices of a start:stop:step selection of dumps numbered from 1, stop included
+    parts = text.split(":")
+    if len(parts) > 3:
+        raise ValueError(text)
+    if len(parts) == 1:
+        parts = [parts[0], parts[0]]
+    start = int(parts[0]) if parts[0] else 1
+    stop = int(parts[1]) if len(parts) > 1 and parts[1] else sys.maxsize
+    step = int(parts[2]) if len(parts) > 2 and parts[2] else 1
+    if start < 1 or stop < start or step < 1:
+        raise ValueError(text)
+    return range(start - 1, stop, step)
+
+
+def parseDumpList(text):
+    # dump numbers of a comma separated list of dumps numbered from 1
+    dumps = [int(part) for part in text.split(",")]
+    if any(dump < 1 for dump in dumps):
+        raise ValueError(text)
+    return dumps
+
+
+def windowDumps(dumps, window):
+    # drops skipped dumps and merges every window consecutive dumps into one named after its first dump;
+    # the simulated ticks of all dumps up to the end of each yielded dump, skipped ones included, are kept in end_ticks
+    merged = None
+    size = 0
+    ticks = 0
+    for index, stats in dumps:
+        if stats is not None and "sim_ticks" in stats:
+            ticks += int(stats["sim_ticks"])
+        if stats is None or not stats.selected:
+            continue
+        if merged is None:
+            merged = (index, stats)
+        else:
+            merged[1].add(stats)
+        if "sim_ticks" in stats:
+            merged[1].end_ticks = ticks
+        size += 1
+        if size == window:
+            yield merged
+            merged = None
+            size = 0
+    if merged is not None:
+        yield merged
+
+
+def formatProgress(index, count):
+    if count is None:  # total is unknown when following
+        return "%d" % (index + 1)
+    return "%d/%d" % (index + 1, count)
+
+
+def processStatsParallel(plan, ert, dumps, paths, args, count, jobs):
+    # dumps are submitted in a bounded window so parsing never runs far ahead of the workers,
+    # and results are collected in submission order so console output stays ordered
+    context = (plan, ert, paths, args, count)
+    with multiprocessing.Pool(args.j, initializer=initWorker, initargs=(context,)) as pool:
+        pending = collections.deque()
+        for task in dumps:
+            pending.append(pool.apply_async(processStatsWorker, (task,)))
+            if len(pending) >= 2 * args.j:
+                collectWorker(pending.popleft().get(), jobs)
+        while pending:
+            collectWorker(pending.popleft().get(), jobs)
+
+
+def collectWorker(result, jobs):
+    output, records, warnings, job = result
+    sys.stdout.write(output)
+    profiler.merge(records)
+    diagnostics.merge(warnings)
+    if job is not None:
+        jobs.append(job)
+
+
+worker_context = None
+
+
+def initWorker(context):
+    global worker_context
+    worker_context = context
+
+
+def processStatsWorker(dump):
+    plan, ert, paths, args, count = worker_context
+    output = io.StringIO()
+    profiler.records = {}  # only the records of this dump are returned to be merged
+    diagnostics.records = {}
+    with contextlib.redirect_stdout(output):
+        job = processStats(plan, ert, dump, paths, args, count)
+    return output.getvalue(), profiler.records, diagnostics.records, job
+
+
+def compileMappings(attributes, config, registry, verbose):
+    # Resolve instances, constants and attributes once, since config.json is the same for every dump
+    print("\n----------------------- Compiling Mappings -----------------------")
     arch = Arch(attributes, config)
-    action_counts = ActionCounts(stats)
-    for file in sorted(os.listdir(paths["mappings"])):
-        path = os.path.join(paths["mappings"], file)
-        base, ext = os.path.splitext(file)
-        base = "mappings.%s" % base
-        if os.path.isfile(path) and ext == ".py":
-            module = __import__(base, fromlist=[""])
-            processMappings(arch, action_counts, module, args.v)
-
-    # Write architecture
-    arch_yaml = {
-        "architecture": {
-            "version": 0.3,
-            "subtree": [arch.arch]
-        }
-    }
+    plan = MappingPlan(arch.arch)
+    for module in registry.getModules(arch.instances):
+        start = len(plan.actions)
+        processMappings(arch, plan, module, verbose)
+        plan.addModule(module.__name__, start)
+    return plan
+
+
+def generateERT(plan, attributes, cache, paths, args):
+    # the architecture is the same for every dump, so a single accelergy run gives the ERT of all dumps
+    input_dir = os.path.join(paths["input"], "ert")
+    output_dir = os.path.join(paths["output"], "ert")
+    os.makedirs(input_dir, exist_ok=True)
+    arch_text = dumpYaml(plan.getArchitecture())
+    with open(os.path.join(input_dir, "architecture.yaml"), "w") as file:
+        file.write(arch_text)
+
+    print("\n---------------------- Generating ERT -------------------------")
+    key = None
+    if cache is not None:
+        key = cache.getKey(arch_text, attributes)
+        if cache.lookup(key, output_dir):
+            print("Reusing cached ERT %s" % key)
+            with open(os.path.join(output_dir, "ERT.yaml")) as file:
+                return loadERT(loadYaml(file))
+
+    accelergy_command = getAccelergyCommand(input_dir, output_dir)
+    print(" ".join(shlex.quote(part) for part in accelergy_command))
+    print()
+    if args.d:
+        print("Energy estimation is skipped since accelergy is not called")
+        return None
+    # outputs of an earlier run must not be taken for those of this architecture
+    for file in ERTCache.files:
+        if os.path.isfile(os.path.join(output_dir, file)):
+            os.remove(os.path.join(output_dir, file))
+    try:
+        returncode = runProcess(accelergy_command, args.accelergy_timeout)
+    except subprocess.TimeoutExpired:
+        raise Exception("Accelergy did not generate the ERT within %s seconds" % args.accelergy_timeout)
+    except OSError as error:
+        raise Exception("Unable to run accelergy: %s" % error)
+    if returncode != 0:
+        raise Exception("Accelergy failed to generate the ERT with exit code %d" % returncode)
+    if not os.path.isfile(os.path.join(output_dir, "ERT.yaml")):
+        raise Exception("Accelergy did not generate %s" % os.path.join(output_dir, "ERT.yaml"))
+    if cache is not None:
+        cache.store(key, output_dir)
+    with open(os.path.join(output_dir, "ERT.yaml")) as file:
+        return loadERT(loadYaml(file))
+
+
+def loadERT(ert_yaml):
+    # maps each component to the energy of each of its actions
+    ert = {}
+    for table in ert_yaml["ERT"]["tables"]:
+        actions = ert.setdefault(table["name"], {})
+        for action in table["actions"]:
+            if action["name"] not in actions:  # the first entry of actions with arguments is used
+                actions[action["name"]] = action["energy"]
+    return ert
+
+
+def estimateEnergy(ert, action_counts):
+    components = []
+    for path, counts in action_counts.action_map.items():
+        energy = 0
+        for action in counts:
+            if path not in ert or action["name"] not in ert[path]:
+                diagnostics.warn("ert_entry", None, path, action["name"])
+                continue
+            energy += action["counts"] * ert[path][action["name"]]
+        components.append({"name": path, "energy": energy})
+    return {"energy_estimation": {
+        "version": 0.3,
+        "components": components,
+    }}
+
+
+def processStats(plan, ert, dump, paths, args, count, runner=None):
+    # Process mappings, returns the result of the accelergy run when accelergy was run synchronously
+    index, totals, missing, duplicate = dump
+    if duplicate is not None:
+        print("\n------------------- Duplicate Dump [%s] --------------------" % formatProgress(index, count))
+        print("Action counts are identical to dump %d, results are in stats-%d" % (duplicate + 1, duplicate + 1))
+        return
+    print("\n----------------- Processing Mappings [%s] ------------------" % formatProgress(index, count))
+    action_counts = plan.getActionCounts(totals, missing, args.v)
+
+    # Write architecture and action counts
     input_dir = os.path.join(paths["input"], "stats-%d" % (index + 1))
     output_dir = os.path.join(paths["output"], "stats-%d" % (index + 1))
-    if not os.path.exists(input_dir):
-        os.makedirs(input_dir)
+    with profiler.measure("phases/write_yaml"):
+        writeInput(input_dir, plan.getArchitecture(), action_counts)
+
+    # estimate energy with the ERT generated for this run
+    if ert is not None:
+        print("\n----------------- Estimating Energy [%s] -------------------" % formatProgress(index, count))
+        os.makedirs(output_dir, exist_ok=True)
+        with profiler.measure("phases/estimate_energy"):
+            energy_yaml = estimateEnergy(ert, action_counts)
+        with open(os.path.join(output_dir, "energy_estimation.yaml"), "w") as file:
+            dumpYaml(energy_yaml, file)
+        return
+
+    if runner is not None:
+        runner.submit(input_dir, output_dir, formatProgress(index, count))
+        return None
+    with profiler.measure("phases/accelergy"):
+        return runAccelergy(input_dir, output_dir, formatProgress(index, count), args)
+
+
+def writeInput(input_dir, arch_yaml, action_counts):
+    os.makedirs(input_dir, exist_ok=True)
     with open(os.path.join(input_dir, "architecture.yaml"), "w") as file:
-        yaml.dump(arch_yaml, file, sort_keys=False)
+        dumpYaml(arch_yaml, file)
 
-    # Write action counts
     action_counts_yaml = {"action_counts": {
         "version": 0.3,
         "local": action_counts.get(),
     }}
     with open(os.path.join(input_dir, "action_counts.yaml"), "w") as file:
-        yaml.dump(action_counts_yaml, file, sort_keys=False)
+        dumpYaml(action_counts_yaml, file)
 
-    # invoke accelergy
-    accelergy_command = "accelergy -o " + output_dir + " " + input_dir + "/*.yaml " + " -v 1"
-    print("\n---------------- Hand-off to Accelergy [%d/%d] ----------------" % (index + 1, count))
-    print(accelergy_command)
+
+def getAccelergyCommand(input_dir, output_dir):
+    # input files are listed explicitly, so no shell is needed to expand them
+    return ["accelergy", "-o", output_dir] + sorted(glob.glob(os.path.join(input_dir, "*.yaml"))) + ["-v", "1"]
+
+
+def printHandOff(accelergy_command, progress):
+    print("\n---------------- Hand-off to Accelergy [%s] ----------------" % progress)
+    print(" ".join(shlex.quote(part) for part in accelergy_command))
     print()
-    if not args.d:
-        os.system(accelergy_command)
 
 
-def processMappings(arch, action_counts, module, verbose):
+def runAccelergy(input_dir, output_dir, progress, args):
+    # runs accelergy and waits for it, its output is written to accelergy.log of the output directory
+    accelergy_command = getAccelergyCommand(input_dir, output_dir)
+    printHandOff(accelergy_command, progress)
+    if args.d:
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    returncode = None
+    error = None
+    with open(os.path.join(output_dir, "accelergy.log"), "w") as log:
+        try:
+            returncode = runProcess(accelergy_command, args.accelergy_timeout, stdout=log, stderr=subprocess.STDOUT)
+        except subprocess.TimeoutExpired:
+            error = "timeout"
+        except OSError as exception:
+            error = str(exception)
+    return getJobResult(input_dir, output_dir, progress, returncode, error, time.perf_counter() - start)
+
+
+def runProcess(command, timeout, **kwargs):
+    # runs command in a session of its own, so that on a timeout or interrupt the processes it started are stopped too
+    with subprocess.Popen(command, start_new_session=True, **kwargs) as process:
+        try:
+            return process.wait(timeout)
+        except BaseException:
+            killProcessGroup(process.pid)
+            process.wait()
+            raise
+
+
+def killProcessGroup(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:  # already exited
+        pass
+
+
+def getJobResult(input_dir, output_dir, progress, returncode, error, seconds):
+    # outcome of an accelergy run, failures are also reported as warnings
+    result = {"input": input_dir, "output": output_dir, "returncode": returncode, "seconds": seconds}
+    if error == "timeout":
+        result["status"] = "timeout"
+        reason = "stopped after %.1f s" % seconds
+    elif error == "stopped":
+        result["status"] = "stopped"
+        reason = "stopped by an interrupt"
+    elif error is not None:
+        result["status"] = "failed"
+        result["error"] = error
+        reason = error
+    elif returncode != 0:
+        result["status"] = "failed"
+        reason = "exit code %d" % returncode
+    else:
+        result["status"] = "ok"
+        reason = None
+    print("Accelergy [%s] %s after %.1f s, log in %s" % (progress, result["status"], seconds,
+                                                         os.path.join(output_dir, "accelergy.log")))
+    if reason is not None:
+        diagnostics.warn("accelergy", None, output_dir, reason)
+    return result
+
+
+def writeJobs(jobs, paths, merge=False):
+    # with merge the earlier runs listed in accelergy.json are kept, unless their dump was run again
+    failed = len([job for job in jobs if job["status"] != "ok"])
+    print("\nAccelergy succeeded for %d of %d dumps" % (len(jobs) - failed, len(jobs)))
+    os.makedirs(paths["output"], exist_ok=True)
+    jobs_path = os.path.join(paths["output"], "accelergy.json")
+    if merge and os.path.isfile(jobs_path):
+        outputs = {job["output"] for job in jobs}
+        with open(jobs_path) as file:
+            jobs = [job for job in json.load(file)["jobs"] if job["output"] not in outputs] + jobs
+    with open(jobs_path, "w") as file:
+        json.dump({"jobs": jobs}, file, indent=2)
+
+
+def processColumnar(plan, ert, dumps, paths, args, count):
+    # the architecture is written once and each dump becomes one row of the action counts file
+    os.makedirs(paths["input"], exist_ok=True)
+    with open(os.path.join(paths["input"], "architecture.yaml"), "w") as file:
+        dumpYaml(plan.getArchitecture(), file)
+    columns = ["%s:%s" % (arch_path, name) for instance, arch_path, name, add, subtract in plan.actions]
+    counts_writer = ColumnarWriter(os.path.join(paths["input"], "action_counts." + args.columnar), columns)
+    energy_writer = None
+    if ert is not None:
+        components = list(dict.fromkeys(arch_path for instance, arch_path, name, add, subtract in plan.actions))
+        os.makedirs(paths["output"], exist_ok=True)
+        energy_writer = ColumnarWriter(os.path.join(paths["output"], "energy_estimation." + args.columnar), components)
+    for index, totals, missing in dumps:
+        print("\n----------------- Processing Mappings [%s] ------------------" % formatProgress(index, count))
+        action_counts = plan.getActionCounts(totals, missing, args.v)
+        with profiler.measure("phases/write_columnar"):
+            counts_writer.write(index, totals)
+        if energy_writer is not None:
+            with profiler.measure("phases/estimate_energy"):
+                energy = estimateEnergy(ert, action_counts)["energy_estimation"]["components"]
+                energy_writer.write(index, [component["energy"] for component in energy])
+    counts_writer.close()
+    if energy_writer is not None:
+        energy_writer.close()
+
+
+def expandColumnar(dumps, paths, args):
+    # generates the accelergy input of selected dumps from the columnar output of an earlier run
+    with open(os.path.join(paths["input"], "architecture.yaml")) as file:
+        arch_yaml = loadYaml(file)
+    for extension in ["csv", "npz"]:
+        counts_path = os.path.join(paths["input"], "action_counts." + extension)
+        if os.path.isfile(counts_path):
+            break
+    else:
+        raise Exception("Unable to find columnar action counts in %s" % paths["input"])
+    columns, rows = readColumnar(counts_path, set(dumps))
+    runner = AccelergyRunner(args.accelergy_jobs, args.accelergy_timeout) if not args.d else None
+    jobs = []
+    try:
+        expandDumps(dumps, columns, rows, counts_path, arch_yaml, runner, paths, args)
+    except BaseException:
+        if runner is not None:
+            runner.stop()
+        raise
+    finally:
+        if runner is not None:
+            runner.join(jobs)
+        if jobs:
+            writeJobs(jobs, paths)
+
+
+def expandDumps(dumps, columns, rows, counts_path, arch_yaml, runner, paths, args):
+    for index, dump in enumerate(dumps):
+        if dump not in rows:
+            raise Exception("Dump %d not found in %s" % (dump, counts_path))
+        action_counts = ActionCounts()
+        for column, counts in zip(columns, rows[dump]):
+            arch_path, name = column.rsplit(":", 1)
+            action_counts.addField(arch_path, name, counts)
+        input_dir = os.path.join(paths["input"], "stats-%d" % dump)
+        output_dir = os.path.join(paths["output"], "stats-%d" % dump)
+        writeInput(input_dir, arch_yaml, action_counts)
+        if runner is not None:
+            runner.submit(input_dir, output_dir, formatProgress(index, len(dumps)))
+        else:
+            runAccelergy(input_dir, output_dir, formatProgress(index, len(dumps)), args)
+
+
+def readColumnar(path, dumps):
+    # returns the columns and the rows of the selected dumps of a columnar file
+    rows = {}
+    if path.endswith(".npz"):
+        data = numpy.load(path)
+        columns = data["columns"].tolist()
+        for dump, row in zip(data["dumps"].tolist(), data["values"].tolist()):
+            if dump in dumps:
+                rows[dump] = row
+        return columns, rows
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        columns = next(reader)[1:]
+        for row in reader:
+            if int(row[0]) in dumps:
+                rows[int(row[0])] = [int(value) for value in row[1:]]
+    return columns, rows
+
+
+def processMappings(arch, plan, module, verbose):
     print("Mapping class %s → %s" % (module.gem5_class, module.accelergy_class))
     if module.gem5_class in arch.instances:
         for instance in arch.instances[module.gem5_class]:
             param = arch.getParam(instance)
             add = module.criteria  # add is either boolean or a function
             if callable(module.criteria):
-                add = module.criteria(param)
+                with profiler.measure("mappings/%s/criteria" % module.__name__):
+                    add = module.criteria(param)
             if add:
                 name = instance.split(".")[-1]
                 if module.name_append != "":
@@ -125,14 +1135,16 @@ def processMappings(arch, action_counts, module, verbose):
                         print("        CONST    %s = %s" % (constant[0], constant[1]))
                 for attribute in module.attributes:
                     try:
-                        if callable(attribute[1]):
-                            value = attribute[1](param)
-                        else:
-                            value = arch.getParamField(instance, attribute[1])
+                        with profiler.measure("mappings/%s/attributes" % module.__name__):
+                            if callable(attribute[1]):
+                                value = attribute[1](param)
+                            else:
+                                value = arch.getParamField(instance, attribute[1])
                     except KeyError:
                         value = None
                     if value is None:
-                        print("        WARNING  cannot locate attribute %s of %s" % (attribute[1], instance))
+                        key = attribute[0] if callable(attribute[1]) else attribute[1]
+                        diagnostics.warn("attribute", module.__name__, instance, key)
                     else:
                         if "attributes" not in component:
                             component["attributes"] = {}
@@ -140,32 +1152,696 @@ def processMappings(arch, action_counts, module, verbose):
                         if verbose:
                             print("        ATTR     %s = %s" % (attribute[0], value))
                 for action in module.actions:
-                    total_counts = 0
-                    for action_name in action[1]:
-                        total_counts += getActionCount(instance, action_name, action_counts)
-                    if len(action) > 2:
-                        for action_name in action[2]:
-                            total_counts -= getActionCount(instance, action_name, action_counts)
-                    action_counts.addField(arch_path, action[0], total_counts)
+                    subtract = action[2] if len(action) > 2 else []
+                    plan.addAction(instance, arch_path, action[0], action[1], subtract)
                     if verbose:
-                        print("        ACTION   %s = %s" % (action[0], total_counts))
+                        print("        ACTION   %s" % action[0])
+
+
+def readGem5Class(path):
+    # gem5_class of a mapping file when it is assigned a string literal at module level, otherwise None
+    try:
+        with open(path) as file:
+            tree = ast.parse(file.read(), path)
+    except SyntaxError:
+        return None  # reported when the module is imported
+    gem5_class = None
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == "gem5_class"
+                                                for target in node.targets):
+            if type(node.value).__name__ == "Str":  # string literals are ast.Str before Python 3.8
+                gem5_class = node.value.s
+            elif isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                gem5_class = node.value.value
+            else:
+                return None
+    return gem5_class
+
+
+def compileSource(instance, source):
+    # action sources with glob wildcards (*, ?, [...]) or starting with re: match several stats whose counts are summed;
+    # returns the (literal prefix, regex) of the stats below the instance and of the global stats, or None
+    if source.startswith("re:"):
+        source = source[len("re:"):]
+        prefix = re.match(r"[^\\.^$*+?{}\[\]|()]*", source).group(0)
+        if source[len(prefix):len(prefix) + 1] in ("*", "?", "{"):
+            prefix = prefix[:-1]  # the last character is optional
+        if hasAlternation(source):
+            prefix = ""  # the alternatives after a top-level | need not share the prefix of the first one
+        pattern = "(?:%s)\\Z" % source
+    elif any(character in source for character in "*?["):
+        prefix = re.match(r"[^*?\[]*", source).group(0)
+        pattern = fnmatch.translate(source)
+    else:
+        return None
+    return ((instance + "." + prefix, re.compile(re.escape(instance + ".") + pattern)),
+            (prefix, re.compile(pattern)))
+
+
+def hasAlternation(regex):
+    # whether regex has a | outside of groups and character classes
+    depth = 0
+    position = 0
+    while position < len(regex):
+        character = regex[position]
+        if character == "\\":
+            position += 1
+        elif character == "[":
+            # skip the class, a ] right after [ or [^ is a literal
+            position += 2 if regex[position + 1:position + 2] == "^" else 1
+            if regex[position:position + 1] == "]":
+                position += 1
+            while position < len(regex) and regex[position] != "]":
+                position += 2 if regex[position] == "\\" else 1
+        elif character == "(":
+            depth += 1
+        elif character == ")":
+            depth -= 1
+        elif character == "|" and depth == 0:
+            return True
+        position += 1
+    return False
 
 
 def getActionCount(instance, action_name, action_counts):
     counts = action_counts.getActionCounts(instance, action_name)
     if counts is None:
         counts = action_counts.getActionCounts("", action_name)
-    if counts is None:
-        print("        WARNING  cannot locate action count %s.%s" % (instance, action_name))
-        counts = 0
     return counts
 
 
+class Profiler:
+    # accumulates wall time and call counts under slash separated names such as phases/parse_stats
+    def __init__(self):
+        self.enabled = False
+        self.records = {}  # name -> [seconds, calls]
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, 1)
+
+    def iterate(self, name, iterator):
+        # measures the time spent producing each item of an iterator
+        if not self.enabled:
+            yield from iterator
+            return
+        iterator = iter(iterator)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start, 0)
+                return
+            self.add(name, time.perf_counter() - start, 1)
+            yield item
+
+    def add(self, name, seconds, calls):
+        if name not in self.records:
+            self.records[name] = [0.0, 0]
+        self.records[name][0] += seconds
+        self.records[name][1] += calls
+
+    def merge(self, records):
+        for name, (seconds, calls) in records.items():
+            self.add(name, seconds, calls)
+
+    def write(self, path):
+        report = {}
+        for name, (seconds, calls) in self.records.items():
+            node = report
+            names = name.split("/")
+            for key in names[:-1]:
+                node = node.setdefault(key, {})
+            node[names[-1]] = {"seconds": seconds, "calls": calls}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+        print("\nProfile written to %s" % path)
+
+
+profiler = Profiler()
+
+
+class Diagnostics:
+    # warnings counted by (kind, mapping, instance, key) so that a stat missing from every dump is reported once
+    # in a summary; with verbose every occurrence is also printed as it happens
+    messages = {
+        "attribute": "cannot locate attribute %s of %s",
+        "action_count": "cannot locate action count %s.%s",
+        "ert_entry": "cannot locate ERT entry %s.%s",
+        "trace_ert_entry": "cannot locate ERT entry %s.%s, its energy is not traced",
+        "accelergy": "accelergy for %s failed: %s",
+    }
+
+    def __init__(self):
+        self.verbose = False
+        self.records = {}  # (kind, mapping, instance, key) -> occurrences
+
+    def warn(self, kind, mapping, instance, key):
+        record = (kind, mapping, instance, key)
+        self.records[record] = self.records.get(record, 0) + 1
+        if self.verbose:
+            print("        WARNING  %s" % self.format(record))
+
+    def merge(self, records):
+        for record, occurrences in records.items():
+            self.records[record] = self.records.get(record, 0) + occurrences
+
+    def format(self, record):
+        kind, mapping, instance, key = record
+        if kind == "attribute":
+            return self.messages[kind] % (key, instance)
+        return self.messages[kind] % (instance, key)
+
+    def summarize(self):
+        if len(self.records) == 0:
+            return
+        print("\n--------------------------- Warnings -----------------------------")
+        for record, occurrences in sorted(self.records.items(), key=lambda item: str(item[0])):
+            mapping = " (%s)" % record[1] if record[1] is not None else ""
+            print("WARNING  %s%s, %d time%s" % (self.format(record), mapping, occurrences,
+                                                "" if occurrences == 1 else "s"))
+
+    def write(self, path):
+        warnings = []
+        for (kind, mapping, instance, key), occurrences in self.records.items():
+            warnings.append({"kind": kind, "mapping": mapping, "instance": instance, "key": key,
+                             "occurrences": occurrences, "message": self.format((kind, mapping, instance, key))})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as file:
+            json.dump({"warnings": warnings}, file, indent=2)
+        print("\nDiagnostics written to %s" % path)
+
+
+diagnostics = Diagnostics()
+
+
+class ColumnarWriter:
+    # writes one row per dump with a value for each column, as csv or as a numpy npz archive
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        if path.endswith(".npz"):
+            self.file = None
+            self.dumps = []
+            self.rows = []
+        else:
+            self.file = open(path, "w", newline="")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(["dump"] + columns)
+
+    def write(self, index, values):
+        if self.file is None:
+            self.dumps.append(index + 1)
+            self.rows.append(values)
+        else:
+            self.writer.writerow([index + 1] + list(values))
+
+    def close(self):
+        if self.file is None:
+            values = numpy.array(self.rows).reshape(len(self.rows), len(self.columns))
+            numpy.savez_compressed(self.path, dumps=numpy.array(self.dumps, dtype=numpy.int64),
+                                   columns=numpy.array(self.columns), values=values)
+        else:
+            self.file.close()
+
+
+class PowerTrace:
+    # energy and average power of every component per dump interval, assuming stats are reset at every dump;
+    # rows are buffered so that a block of dumps is converted with one vectorised operation
+    def __init__(self, plan, ert, path):
+        self.components = list(dict.fromkeys(arch_path for instance, arch_path, name, add, subtract in plan.actions))
+        component_index = {component: index for index, component in enumerate(self.components)}
+        self.action_components = []
+        self.action_energies = []
+        for instance, arch_path, name, add, subtract in plan.actions:
+            if arch_path not in ert or name not in ert[arch_path]:
+                diagnostics.warn("trace_ert_entry", None, arch_path, name)
+            self.action_components.append(component_index[arch_path])
+            self.action_energies.append(ert.get(arch_path, {}).get(name, 0))
+        columns = ["sim_ticks", "sim_seconds", "time", "total:energy_pJ", "total:power_W"]
+        for component in self.components:
+            columns += [component + ":energy_pJ", component + ":power_W"]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.writer = ColumnarWriter(path, columns)
+        self.block = []
+        self.time = 0.0
+
+    def trace(self, dumps, times):
+        for dump in dumps:
+            index, totals = dump[0], dump[1]
+            self.block.append((index, totals, times.pop(index, (None, None, None))))
+            if len(self.block) >= NUMPY_BLOCK_SIZE:
+                self.flush()
+            yield dump
+        self.flush()
+        self.writer.close()
+
+    def flush(self):
+        if not self.block:
+            return
+        for (index, totals, (ticks, seconds, end_seconds)), energies in zip(self.block, self.getEnergies()):
+            total = sum(energies)
+            row = [ticks, seconds]
+            if seconds is not None:
+                self.time = end_seconds if end_seconds is not None else self.time + seconds
+                row += [self.time, total, getPower(total, seconds)]
+            else:
+                row += [None, total, None]
+            for energy in energies:
+                row += [energy, getPower(energy, seconds)]
+            self.writer.write(index, row)
+        self.block = []
+
+    def getEnergies(self):
+        # component energies of each buffered dump
+        if numpy is not None:
+            if not hasattr(self, "order"):
+                components = numpy.array(self.action_components, dtype=numpy.intp)
+                self.order = numpy.argsort(components, kind="stable")
+                self.present, self.starts = numpy.unique(components[self.order], return_index=True)
+                self.energy_vector = numpy.array(self.action_energies, dtype=numpy.float64)[self.order]
+            energies = numpy.zeros((len(self.block), len(self.components)))
+            if len(self.order) > 0:
+                totals = numpy.array([totals for index, totals, time in self.block], dtype=numpy.float64)
+                weighted = totals.reshape(len(self.block), -1)[:, self.order] * self.energy_vector
+                energies[:, self.present] = numpy.add.reduceat(weighted, self.starts, axis=1)
+            return energies.tolist()
+        rows = []
+        for index, totals, time in self.block:
+            energies = [0.0] * len(self.components)
+            for action, counts in enumerate(totals):
+                energies[self.action_components[action]] += counts * self.action_energies[action]
+            rows.append(energies)
+        return rows
+
+
+def getPower(energy, seconds):
+    # average power in W of an energy in pJ
+    if not seconds:
+        return None
+    return energy * 1e-12 / seconds
+
+
+class MappingRegistry:
+    # mapping files of several directories indexed by gem5_class, the class of each file is read without importing it
+    # and kept in a manifest in __pycache__ of the directory, so only mappings of classes in config.json are imported
+    manifest = "__pycache__/mappings_manifest.json"
+
+    def __init__(self, directories):
+        self.files = {}  # mapping file of each module name, files of later directories replace earlier ones
+        self.classes = {}  # gem5_class of each module name, None until imported when it is not a string literal
+        self.modules = {}  # imported modules by module name
+        for directory in directories:
+            self.scan(directory)
+
+    def scan(self, directory):
+        # entries of the manifest are reused while the mtime and size of their file are unchanged
+        manifest_path = os.path.join(directory, self.manifest)
+        manifest = {}
+        if os.path.isfile(manifest_path):
+            try:
+                with open(manifest_path) as file:
+                    manifest = json.load(file)
+            except ValueError:
+                manifest = {}
+        entries = {}
+        for file in sorted(os.listdir(directory)):
+            path = os.path.join(directory, file)
+            base, ext = os.path.splitext(file)
+            if not os.path.isfile(path) or ext != ".py":
+                continue
+            stat = os.stat(path)
+            entry = manifest.get(file)
+            if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                with profiler.measure("mappings/manifest"):
+                    entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "gem5_class": readGem5Class(path)}
+            entries[file] = entry
+            self.files["mappings.%s" % base] = path
+            self.classes["mappings.%s" % base] = entry["gem5_class"]
+        if entries != manifest:
+            try:
+                os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+                with open("%s.%d.tmp" % (manifest_path, os.getpid()), "w") as file:
+                    json.dump(entries, file, indent=2)
+                os.replace("%s.%d.tmp" % (manifest_path, os.getpid()), manifest_path)
+            except OSError:
+                pass  # read-only mapping directories are scanned on every run
+
+    def getClasses(self):
+        for name, gem5_class in self.classes.items():
+            if gem5_class is None:
+                self.classes[name] = self.load(name).gem5_class
+        return set(self.classes.values())
+
+    def getModules(self, classes):
+        # modules of the given gem5 classes in file name order
+        return [self.load(name) for name in sorted(self.files) if self.classes[name] in classes]
+
+    def load(self, name):
+        if name not in self.modules:
+            module = sys.modules.get(name)
+            if module is None or getattr(module, "__file__", None) != self.files[name]:
+                with profiler.measure("mappings/%s/import" % name):
+                    spec = importlib.util.spec_from_file_location(name, self.files[name])
+                    module = importlib.util.module_from_spec(spec)
+                    sys.modules[name] = module
+                    try:
+                        spec.loader.exec_module(module)
+                    except BaseException:
+                        del sys.modules[name]
+                        raise
+            self.modules[name] = module
+        return self.modules[name]
+
+
+class AccelergyRunner:
+    # runs accelergy processes on a pool of background threads, at most jobs at a time and each stopped after timeout
+    # seconds, while the caller goes on with the next dumps
+    def __init__(self, jobs, timeout):
+        self.timeout = timeout
+        self.executor = concurrent.futures.ThreadPoolExecutor(jobs)
+        self.futures = []
+        self.lock = threading.Lock()
+        self.processes = set()  # running accelergy processes, each leading a process group
+        self.stopped = False
+
+    def submit(self, input_dir, output_dir, progress):
+        accelergy_command = getAccelergyCommand(input_dir, output_dir)
+        printHandOff(accelergy_command, progress)
+        self.futures.append(self.executor.submit(self.run, accelergy_command, input_dir, output_dir, progress))
+
+    def run(self, accelergy_command, input_dir, output_dir, progress):
+        os.makedirs(output_dir, exist_ok=True)
+        start = time.perf_counter()
+        returncode = None
+        error = None
+        with open(os.path.join(output_dir, "accelergy.log"), "w") as log:
+            try:
+                with self.lock:  # a stop either sees the process or prevents it from being started
+                    process = None
+                    if not self.stopped:
+                        process = subprocess.Popen(accelergy_command, stdout=log, stderr=subprocess.STDOUT,
+                                                   start_new_session=True)
+                        self.processes.add(process.pid)
+                if process is None:
+                    error = "stopped"
+                else:
+                    try:
+                        returncode = process.wait(self.timeout)
+                        if returncode != 0 and self.stopped:
+                            error = "stopped"
+                    except subprocess.TimeoutExpired:
+                        killProcessGroup(process.pid)
+                        process.wait()
+                        error = "timeout"
+                    finally:
+                        with self.lock:
+                            self.processes.discard(process.pid)
+            except OSError as exception:
+                error = str(exception)
+        seconds = time.perf_counter() - start
+        with self.lock:  # runs finish on several threads, their results are reported one at a time
+            if profiler.enabled:
+                profiler.add("phases/accelergy", seconds, 1)
+            return getJobResult(input_dir, output_dir, progress, returncode, error, seconds)
+
+    def stop(self):
+        # kills the running accelergy processes with the processes they started, queued runs are not started
+        with self.lock:
+            self.stopped = True
+            for pid in self.processes:
+                killProcessGroup(pid)
+
+    def join(self, jobs):
+        # waits for all submitted runs and appends their results to jobs in submission order, also when interrupted
+        try:
+            concurrent.futures.wait(self.futures)
+        except BaseException:
+            self.stop()
+            raise
+        finally:
+            self.executor.shutdown()
+            jobs += [future.result() for future in self.futures]
+
+
+class ERTCache:
+    # content addressed store of accelergy ERT/ART outputs, evicting least recently used entries
+    files = ["ERT.yaml", "ART.yaml", "ERT_summary_verbose.yaml", "ART_summary_verbose.yaml",
+             "flattened_architecture_verbose.yaml"]
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def getKey(self, arch_text, attributes):
+        digest = hashlib.sha256()
+        digest.update(arch_text.encode())
+        digest.update(("technology=%s\n" % attributes["technology"]).encode())
+        digest.update(("device_type=%s\n" % attributes["device_type"]).encode())
+        return digest.hexdigest()
+
+    def lookup(self, key, output_dir):
+        entry = os.path.join(self.directory, key)
+        if not os.path.isfile(os.path.join(entry, "ERT.yaml")):
+            return False
+        os.makedirs(output_dir, exist_ok=True)
+        for file in os.listdir(entry):
+            shutil.copy(os.path.join(entry, file), output_dir)
+        os.utime(entry)  # mark as recently used
+        return True
+
+    def store(self, key, output_dir):
+        if not os.path.isfile(os.path.join(output_dir, "ERT.yaml")):
+            return
+        entry = os.path.join(self.directory, key)
+        staging = entry + ".%d.tmp" % os.getpid()
+        os.makedirs(staging, exist_ok=True)
+        for file in self.files:
+            if os.path.isfile(os.path.join(output_dir, file)):
+                shutil.copy(os.path.join(output_dir, file), staging)
+        try:
+            os.rename(staging, entry)
+        except OSError:  # stored concurrently by another run
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            if name.endswith(".tmp") or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, entry))
+            total_size += size
+        for mtime, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+
+
+class MappingPlan:
+    def __init__(self, arch):
+        self.arch = arch  # architecture tree, identical for every dump
+        self.actions = []  # (instance, arch_path, action name, stats to add, stats to subtract)
+        self.terms = []  # (instance, stat name) pairs read by the actions
+        self.term_index = {}
+        self.patterns = {}  # compiled patterns of the terms whose stat name is a glob or regex
+        self.action_terms = []  # (term, coefficient) pairs of each action in mapping order
+        self.matrix = None  # sparse coefficient matrix for the NumPy engine, built on first use
+        self.modules = []  # (mapping module, first action, end action) in mapping order
+
+    def getArchitecture(self):
+        return {
+            "architecture": {
+                "version": 0.3,
+                "subtree": [self.arch]
+            }
+        }
+
+    def addModule(self, module, start):
+        self.modules.append((module, start, len(self.actions)))
+
+    def addAction(self, instance, arch_path, name, add, subtract):
+        self.actions.append((instance, arch_path, name, tuple(add), tuple(subtract)))
+        action_terms = []
+        for action_name in add:
+            action_terms.append((self.getTerm(instance, action_name), 1))
+        for action_name in subtract:
+            action_terms.append((self.getTerm(instance, action_name), -1))
+        self.action_terms.append(action_terms)
+
+    def getTerm(self, instance, action_name):
+        key = (instance, action_name)
+        if key not in self.term_index:
+            self.term_index[key] = len(self.terms)
+            patterns = compileSource(instance, action_name)
+            if patterns is not None:
+                self.patterns[len(self.terms)] = patterns
+            self.terms.append(key)
+        return self.term_index[key]
+
+    def getStatKeys(self):
+        # every stat the actions may read, including the global fallback of getActionCount
+        keys = set()
+        for term, (instance, action_name) in enumerate(self.terms):
+            if term not in self.patterns:
+                keys.add(instance + "." + action_name)
+                keys.add(action_name)
+        return keys
+
+    def getStatPrefixes(self):
+        # literal prefixes of the stats the glob and regex terms may match
+        prefixes = set()
+        for patterns in self.patterns.values():
+            for prefix, regex in patterns:
+                prefixes.add(prefix)
+        return tuple(sorted(prefixes))
+
+    def getPatternCount(self, term, stats):
+        # sum of the stats matching the pattern below the instance, or else of the matching global stats
+        for prefix, regex in self.patterns[term]:
+            counts = stats.sum(stats.table.match(prefix, regex))
+            if counts is not None:
+                return int(counts)
+        return None
+
+    def evaluateDumps(self, dumps, use_numpy):
+        # yields (index, action totals, missing terms) for each (index, stats) dump
+        if not use_numpy:
+            for index, stats in dumps:
+                with profiler.measure("phases/evaluate"):
+                    totals, missing = self.evaluate(stats)
+                yield index, totals, missing
+            return
+        while True:
+            block = list(itertools.islice(dumps, NUMPY_BLOCK_SIZE))
+            if not block:
+                return
+            indices, stats_block = zip(*block)
+            with profiler.measure("phases/evaluate_numpy"):
+                totals, missing = self.evaluateBlock(stats_block)
+            for index, row, row_missing in zip(indices, totals.tolist(), missing):
+                yield index, row, row_missing
+
+    def evaluate(self, stats):
+        action_counts = ActionCounts(stats)
+        values = []
+        missing = set()
+        with profiler.measure("phases/lookup_stats"):
+            for term, (instance, action_name) in enumerate(self.terms):
+                if term in self.patterns:
+                    counts = self.getPatternCount(term, stats)
+                else:
+                    counts = getActionCount(instance, action_name, action_counts)
+                if counts is None:
+                    missing.add(term)
+                    counts = 0
+                values.append(counts)
+        totals = []
+        for module, start, end in self.modules:
+            with profiler.measure("mappings/%s/evaluate" % module):
+                for action_terms in self.action_terms[start:end]:
+                    total_counts = 0
+                    for term, coefficient in action_terms:
+                        total_counts += coefficient * values[term]
+                    totals.append(total_counts)
+        return totals, missing
+
+    def evaluateBlock(self, stats_block):
+        # builds a (dumps x terms) matrix and multiplies it by the sparse (terms x actions) coefficients;
+        # the stats arrays of the block are stacked and the terms gathered by their columns in the stats table
+        if self.matrix is None:
+            self.matrix = self.buildMatrix()
+        keys, columns, coefficients, actions, starts = self.matrix
+        table = stats_block[0].table
+        key_columns = numpy.array(table.getColumns(key for key, fallback in keys), dtype=numpy.intp)
+        fallback_columns = numpy.array(table.getColumns(fallback for key, fallback in keys), dtype=numpy.intp)
+        stats_values = numpy.zeros((len(stats_block), len(table.keys) + 1))
+        stats_present = numpy.zeros((len(stats_block), len(table.keys) + 1), dtype=bool)
+        for row, stats in enumerate(stats_block):
+            stats_values[row, :len(stats.values)] = numpy.frombuffer(stats.values, dtype=numpy.float64)
+            stats_present[row, :len(stats.present)] = numpy.frombuffer(stats.present, dtype=numpy.uint8)
+        key_present = stats_present[:, key_columns]
+        fallback_present = stats_present[:, fallback_columns]
+        values = numpy.where(key_present, stats_values[:, key_columns],
+                             numpy.where(fallback_present, stats_values[:, fallback_columns], 0))
+        found = key_present | fallback_present
+        for term, patterns in self.patterns.items():
+            # glob and regex terms sum their matching columns, falling back to the global stats per dump
+            sums = []
+            for prefix, regex in patterns:
+                pattern_columns = numpy.array(table.match(prefix, regex), dtype=numpy.intp)
+                pattern_present = stats_present[:, pattern_columns]
+                sums.append((pattern_present.any(axis=1),
+                             numpy.where(pattern_present, stats_values[:, pattern_columns], 0).sum(axis=1)))
+            (local_found, local_sum), (global_found, global_sum) = sums
+            values[:, term] = numpy.where(local_found, local_sum, numpy.where(global_found, global_sum, 0))
+            found[:, term] = local_found | global_found
+        values = values.astype(numpy.int64)
+        missing = [set(numpy.flatnonzero(row).tolist()) for row in ~found]
+        totals = numpy.zeros((len(stats_block), len(self.actions)), dtype=numpy.int64)
+        if len(actions) > 0:
+            products = values[:, columns] * coefficients
+            totals[:, actions] = numpy.add.reduceat(products, starts, axis=1)
+        return totals, missing
+
+    def buildMatrix(self):
+        # coefficients are stored row by row (CSR) so summing each action is a single reduceat
+        keys = [(instance + "." + action_name, action_name) for instance, action_name in self.terms]
+        columns = []
+        coefficients = []
+        actions = []
+        starts = []
+        for action, action_terms in enumerate(self.action_terms):
+            if len(action_terms) == 0:
+                continue
+            actions.append(action)
+            starts.append(len(columns))
+            for term, coefficient in action_terms:
+                columns.append(term)
+                coefficients.append(coefficient)
+        return (keys, numpy.array(columns, dtype=numpy.intp), numpy.array(coefficients, dtype=numpy.int64),
+                numpy.array(actions, dtype=numpy.intp), numpy.array(starts, dtype=numpy.intp))
+
+    def getActionCounts(self, totals, missing, verbose):
+        action_counts = ActionCounts()
+        last_path = None
+        for module, start, end in self.modules:
+            for action in range(start, end):
+                instance, arch_path, name, add, subtract = self.actions[action]
+                if verbose and arch_path != last_path:
+                    print("    %s → %s" % (instance, arch_path))
+                    last_path = arch_path
+                if missing:
+                    for term, coefficient in self.action_terms[action]:
+                        if term in missing:
+                            diagnostics.warn("action_count", module, *self.terms[term])
+                action_counts.addField(arch_path, name, totals[action])
+                if verbose:
+                    print("        ACTION   %s = %s" % (name, totals[action]))
+        return action_counts
+
+
 class Arch:
     def __init__(self, attributes, config):
         self.arch = {"name": "system", "attributes": {}}  # architecture tree
+        self.components = {}  # architecture tree component of each dotted path below the root
         self.config = config
         self.instances = {}  # instances of each gem5 class in config
+        self.params = {}  # config node of each dotted path in config
         self.populateClassInstances(config["system"], "system")
 
         if "technology" not in attributes:
@@ -184,6 +1860,8 @@ class Arch:
         self.arch["attributes"]["clockrate"] = clockrate
 
     def populateClassInstances(self, source, path):
+        if path not in self.params:  # the first node reached by a path takes precedence
+            self.params[path] = source
         if "type" in source:
             if source["type"] not in self.instances:
                 self.instances[source["type"]] = []
@@ -199,54 +1877,38 @@ class Arch:
                         self.populateClassInstances(entry, "%s.%s%d" % (path, key, index))
 
     def addLocal(self, path, name, accelergy_class, gem5_class):
+        component = self.getComponent(path)
+        if "local" not in component:
+            component["local"] = []
+        newComponent = {"name": name, "class": accelergy_class, "gem5_class": gem5_class}
+        component["local"].append(newComponent)
+        return newComponent
+
+    def getComponent(self, path):
+        # components are indexed by dotted path so that building wide trees stays linear
+        if path in self.components:
+            return self.components[path]
         pathNames = path.split(".")
         if pathNames[0] == self.arch["name"]:
             component = self.arch
         else:
             raise Exception("Root component %s does not match" % pathNames[0])
+        componentPath = pathNames[0]
         for pathName in pathNames[1:]:
-            nextComponent = None
-            if "subtree" in component:
-                for c in component["subtree"]:
-                    if c["name"] == pathName:
-                        nextComponent = c
-            else:
-                component["subtree"] = []
-            if nextComponent is None:
+            componentPath += "." + pathName
+            if componentPath not in self.components:
+                if "subtree" not in component:
+                    component["subtree"] = []
                 nextComponent = {"name": pathName}
                 component["subtree"].append(nextComponent)
-            component = nextComponent
-        if "local" not in component:
-            component["local"] = []
-        newComponent = {"name": name, "class": accelergy_class, "gem5_class": gem5_class}
-        component["local"].append(newComponent)
-        return newComponent
+                self.components[componentPath] = nextComponent
+            component = self.components[componentPath]
+        return component
 
     def getParam(self, path):
-        names = path.split(".")
-        source = self.config
-        for name in names:
-            sourceNext = None
-            for key, value in source.items():
-                if type(value) == dict:
-                    if key == name:
-                        sourceNext = value
-                        break
-                if type(value) == list and len(value) > 0 and type(value[0]) == dict:
-                    if len(value) == 1:
-                        if key == name:
-                            sourceNext = value[0]
-                            break
-                    else:
-                        for index, entry in enumerate(value):
-                            if ("%s%d" % (key, index)) == name:
-                                sourceNext = entry
-                                break
-            if sourceNext is None:
-                raise Exception("Unable to find source component " + path)
-            else:
-                source = sourceNext
-        return source
+        if path in self.params:
+            return self.params[path]
+        raise Exception("Unable to find source component " + path)
 
     def getParamField(self, path, field):
         source = self.getParam(path)
@@ -268,8 +1930,117 @@ class Arch:
             return None
 
 
+class StatsTable:
+    # stat names interned once per run, every StatsDump stores its values in columns aligned to this table
+    def __init__(self):
+        self.keys = []
+        self.columns = {}
+        self.sorted_keys = []  # prefix index of the keys, rebuilt when keys were added
+        self.matches = {}  # columns of each (prefix, regex) pattern for the current sorted keys
+
+    def intern(self, key):
+        column = self.columns.get(key)
+        if column is None:
+            column = len(self.keys)
+            self.columns[key] = column
+            self.keys.append(key)
+        return column
+
+    def getColumns(self, keys):
+        # column of each key, or one past the last column for keys never seen, which no dump contains
+        return [self.columns.get(key, len(self.keys)) for key in keys]
+
+    def match(self, prefix, regex):
+        # columns of the keys matching regex, only the sorted keys starting with prefix are tested
+        if len(self.sorted_keys) != len(self.keys):
+            self.sorted_keys = sorted(self.keys)
+            self.matches = {}
+        if (prefix, regex) not in self.matches:
+            columns = []
+            for position in range(bisect.bisect_left(self.sorted_keys, prefix), len(self.sorted_keys)):
+                key = self.sorted_keys[position]
+                if not key.startswith(prefix):
+                    break
+                if regex.match(key):
+                    columns.append(self.columns[key])
+            self.matches[(prefix, regex)] = columns
+        return self.matches[(prefix, regex)]
+
+
+class StatsDump:
+    # the stats of one dump as doubles aligned to a StatsTable, with a flag per column telling whether the dump
+    # contains that stat; counts are exact up to 2**53
+    def __init__(self, table):
+        self.table = table
+        self.values = array.array("d")
+        self.present = bytearray()
+        self.selected = True  # false for the dumps outside a --dumps selection, only read for their simulated time
+        self.end_ticks = None  # simulated ticks from the first dump to the end of this one, when known
+
+    def set(self, key, value):
+        column = self.table.intern(key)
+        if column >= len(self.values):
+            grow = len(self.table.keys) - len(self.values)
+            self.values.extend(itertools.repeat(0.0, grow))
+            self.present.extend(bytes(grow))
+        try:
+            self.values[column] = float(value)
+        except ValueError:
+            self.values[column] = float("nan")
+        self.present[column] = 1
+
+    def getColumn(self, key):
+        column = self.table.columns.get(key)
+        if column is None or column >= len(self.present) or not self.present[column]:
+            return None
+        return column
+
+    def __contains__(self, key):
+        return self.getColumn(key) is not None
+
+    def __getitem__(self, key):
+        column = self.getColumn(key)
+        if column is None:
+            raise KeyError(key)
+        return self.values[column]
+
+    def __len__(self):
+        return sum(self.present)
+
+    def get(self, key, default=None):
+        column = self.getColumn(key)
+        return default if column is None else self.values[column]
+
+    def add(self, other):
+        # sums the stats of a later dump into this one, stats in CONSTANT_STATS take the value of the later dump
+        if len(other.values) > len(self.values):
+            grow = len(other.values) - len(self.values)
+            self.values.extend(itertools.repeat(0.0, grow))
+            self.present.extend(bytes(grow))
+        for column, present in enumerate(other.present):
+            if not present:
+                continue
+            if self.present[column] and self.table.keys[column] not in CONSTANT_STATS:
+                self.values[column] += other.values[column]
+            else:
+                self.values[column] = other.values[column]
+            self.present[column] = 1
+
+    def sum(self, columns):
+        # total of the given columns, or None when the dump contains none of them
+        present = [column for column in columns if column < len(self.present) and self.present[column]]
+        if len(present) == 0:
+            return None
+        return sum(self.values[column] for column in present)
+
+    def items(self):
+        for column, key in enumerate(self.table.keys[:len(self.present)]):
+            if self.present[column]:
+                yield key, self.values[column]
+
+
 class ActionCounts:
-    def __init__(self, stats):
+    def __init__(self, stats=None):
         self.stats = stats
         self.action_map = {}
 
@@ -278,8 +2049,9 @@ class ActionCounts:
             field = source_name
         else:
             field = source_path + "." + source_name
-        if field in self.stats:
-            return int(self.stats[field])
+        counts = self.stats.get(field)
+        if counts is not None:
+            return int(counts)
         else:
             return None
 
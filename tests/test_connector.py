@@ -0,0 +1,109 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import connector
+
+
+STATS = """
+---------- Begin Simulation Statistics ----------
+system.cpu.commit.op_class_0::IntAlu    26571599    # Class of committed instruction
+system.cpu.iq.FU_type_0::IntAlu         28236199    # Type of FU issued
+system.cpu.iq.FU_type_0::IntMult          271830    # Type of FU issued
+system.cpu.numCycles                    66294613    # number of cpu cycles simulated
+---------- End Simulation Statistics   ----------
+""".splitlines(True)
+
+
+class CompileSourceTest(unittest.TestCase):
+    def evaluate(self, source):
+        plan = connector.MappingPlan({})
+        plan.addAction("system.cpu", "system.chip.cpu", "action", [source], [])
+        plan.addModule("test", 0)
+        stats = list(connector.parseStats(STATS, plan.getStatKeys(), prefixes=plan.getStatPrefixes()))
+        totals, missing = plan.evaluate(stats[0])
+        return totals[0], missing
+
+    def testPrefix(self):
+        local, fallback = connector.compileSource("system.cpu", "re:iq\\.FU_type_0::Int(Alu|Mult)")
+        self.assertEqual(local[0], "system.cpu.iq")
+        self.assertEqual(fallback[0], "iq")
+
+    def testAlternation(self):
+        local, fallback = connector.compileSource("system.cpu", "re:op_class_0::IntAlu|iq\\.FU_type_0::IntAlu")
+        self.assertEqual(local[0], "system.cpu.")
+        self.assertEqual(fallback[0], "")
+        self.assertEqual(self.evaluate("re:op_class_0::IntAlu|iq\\.FU_type_0::IntAlu"), (28236199, set()))
+        self.assertEqual(self.evaluate("re:commit\\.op_class_0::IntAlu|iq\\.FU_type_0::IntAlu"),
+                         (26571599 + 28236199, set()))
+
+    def testAlternationInGroupOrClass(self):
+        self.assertFalse(connector.hasAlternation("iq\\.FU_type_0::Int(Alu|Mult)"))
+        self.assertFalse(connector.hasAlternation("a[|]b"))
+        self.assertFalse(connector.hasAlternation("a\\|b"))
+        self.assertTrue(connector.hasAlternation("a|(b)"))
+        self.assertEqual(self.evaluate("re:iq\\.FU_type_0::Int(Alu|Mult)"), (28236199 + 271830, set()))
+
+
+
+def makeStats(count):
+    # stats.txt of count dumps, dump n (numbered from 1) taking n seconds of 1000 ticks and n cycles
+    lines = []
+    for dump in range(1, count + 1):
+        lines += [
+            "\n",
+            "---------- Begin Simulation Statistics ----------\n",
+            "sim_freq                                      1000    # Frequency of simulated ticks\n",
+            "sim_ticks                                    %d    # Number of ticks simulated\n" % (1000 * dump),
+            "system.cpu.numCycles                         %d    # number of cpu cycles simulated\n" % dump,
+            "---------- End Simulation Statistics   ----------\n",
+        ]
+    return lines
+
+
+class ParseStatsTest(unittest.TestCase):
+    def testDumpRangeWithStep(self):
+        lines = iter(makeStats(7))
+        dumps = list(connector.parseStats(lines, dumps=connector.parseDumpRange("2:6:2")))
+        self.assertEqual([stats and stats["system.cpu.numCycles"] for stats in dumps], [None, 2, None, 4, None, 6])
+        # reading stops at the begin marker of the first dump after the selection
+        self.assertEqual(next(lines).split()[0], "sim_freq")
+
+    def testSkippedKeys(self):
+        dumps = list(connector.parseStats(makeStats(3), dumps=connector.parseDumpRange("2"),
+                                          skipped_keys={"sim_ticks"}))
+        self.assertEqual(len(dumps), 2)
+        self.assertFalse(dumps[0].selected)
+        self.assertEqual(list(dumps[0].items()), [("sim_ticks", 1000)])
+        self.assertTrue(dumps[1].selected)
+        self.assertEqual(dumps[1]["system.cpu.numCycles"], 2)
+
+
+class WindowDumpsTest(unittest.TestCase):
+    def testShortLastWindow(self):
+        dumps = list(connector.windowDumps(enumerate(connector.parseStats(makeStats(5))), 2))
+        self.assertEqual([index for index, stats in dumps], [0, 2, 4])
+        self.assertEqual([stats["system.cpu.numCycles"] for index, stats in dumps], [3, 7, 5])
+        self.assertEqual([stats["sim_ticks"] for index, stats in dumps], [3000, 7000, 5000])
+        # sim_freq is in CONSTANT_STATS and is not summed
+        self.assertEqual([stats["sim_freq"] for index, stats in dumps], [1000] * 3)
+        self.assertEqual([stats.end_ticks for index, stats in dumps], [3000, 10000, 15000])
+
+    def testTraceTimeAcrossSkippedDumps(self):
+        stats = connector.parseStats(makeStats(5), dumps=connector.parseDumpRange("2:4:2"), skipped_keys={"sim_ticks"})
+        times = {}
+        dumps = list(connector.recordTimes(connector.windowDumps(enumerate(stats), 1), times))
+        self.assertEqual([index for index, stats in dumps], [1, 3])
+        # the end time of each dump includes the skipped dumps before it
+        self.assertEqual(times[1][0], 2000)
+        self.assertAlmostEqual(times[1][1], 2.0)
+        self.assertAlmostEqual(times[1][2], 3.0)
+        self.assertEqual(times[3][0], 4000)
+        self.assertAlmostEqual(times[3][1], 4.0)
+        self.assertAlmostEqual(times[3][2], 10.0)
+
+
+if __name__ == "__main__":
+    unittest.main()